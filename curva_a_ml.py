@@ -5,6 +5,7 @@ App GUI (Tkinter) para rodar o scraper do Mercado Livre (Curva A)
 - Faz buscas no padrão "Marca + Modelo + Capacidade" (ou usa consultas cruas)
 - Captura só os N primeiros resultados por termo
 - Abre a PDP para consolidar vendedor/vendidos/preço/avaliações
+- Processa vários termos em paralelo (pool de contextos do Playwright assíncrono)
 - Salva parciais e, ao final, o consolidado
 - Comparação com lojas próprias (campo editável)
 
@@ -17,7 +18,7 @@ Como empacotar (resumo):
    pyinstaller --noconfirm --onedir --windowed ^
      --name "CurvaA-ML" ^
      --add-data "ms-playwright;ms-playwright" ^
-     --hidden-import=playwright.sync_api --hidden-import=pyee ^
+     --hidden-import=playwright.async_api --hidden-import=pyee ^
      ml_curvaA_app.py
 
 3) Distribua a pasta dist/CurvaA-ML/. O executável usará o Chromium embutido.
@@ -28,18 +29,30 @@ Observações:
 - Se não incluir ms-playwright no build, o app tentará usar o cache do usuário.
 """
 from __future__ import annotations
-import os, sys, re, time, random, threading, queue, urllib.parse, traceback
-from dataclasses import dataclass
-from datetime import datetime
+import os, sys, re, time, random, threading, queue, urllib.parse, traceback, asyncio, json, csv, subprocess
+import logging, logging.handlers, functools
+from dataclasses import dataclass, field
 from typing import List, Optional
 
+import numpy as np
 import pandas as pd
 
+try:  # leitor de Excel em Rust (python-calamine), bem mais rápido que o openpyxl; opcional
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = None  # padrão do pandas
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
 # -------- Playwright --------
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
+from playwright.async_api import async_playwright, TimeoutError as PWTimeout
+
+# Log do scraper: a thread só enfileira registros (FilaLogHandler); a GUI formata e exibe
+logger = logging.getLogger("curva_a_ml")
+logger.setLevel(logging.INFO)
+logger.propagate = False
 
 # ========================= Scraper Core (reutilizado/adaptado) =========================
 SEARCH_BASE = "https://lista.mercadolivre.com.br/"
@@ -50,6 +63,23 @@ DEFAULT_HEADLESS = True
 DEFAULT_RAW_QUERIES = False
 DEFAULT_MINI_PAUSAS = True
 DEFAULT_SCROLL = True
+DEFAULT_DEBUG_SHOTS = False
+DEFAULT_LOG_DETALHADO = False  # mostra também as linhas por PDP (nível DEBUG)
+DEFAULT_WORKERS = 3  # navegadores em paralelo (~300 MB de RAM cada)
+# Pausa entre termos adaptativa: dobra quando o site trava/bloqueia, encolhe quando está tudo ok
+THROTTLE_START = 0.3
+THROTTLE_MIN = 0.2
+THROTTLE_MAX = 5.0
+LOG_BATCH_MAX = 200  # máx. de linhas de log inseridas por ciclo da GUI
+LOG_MAX_LINES = 5000  # o Text do log guarda só as últimas N linhas
+POLL_MIN_MS = 20   # intervalo de leitura do log/progresso quando está chegando dado
+POLL_MAX_MS = 500  # teto quando ocioso (o intervalo dobra a cada ciclo vazio)
+FS_CACHE_TTL_S = 2  # validade das checagens isdir/isfile feitas pela GUI
+# Textos que o pandas lê como vazio (na_values padrão); o leitor de CSV descarta os mesmos
+NA_TEXTOS = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
 
 UA_POOL = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
@@ -74,8 +104,33 @@ ANTI_BOT_HINTS = [
     "captcha",
 ]
 
+# Só lemos texto do DOM: imagens, fontes, CSS, mídia e rastreadores são descartados
+BLOCKED_RESOURCE_TYPES = {"image", "font", "stylesheet", "media"}
+BLOCKED_URL_HINTS = ("googletagmanager", "google-analytics", "doubleclick", "facebook.net", "analytics", "hotjar")
+
 BRANDS = ["LIQUI MOLY", "ALPINESTARS", "CASTROL", "TIRRENO", "MOTUL", "FRAM", "DID"]
 
+# Regex pré-compiladas (usadas por card/PDP/título no laço principal)
+_RE_COOKIES = re.compile("Aceitar|Entendi|Accept|Concordo|OK", re.I)
+_RE_INT = re.compile(r"(\d[\d\.,]*)")
+_RE_NOTA = re.compile(r"(\d+(\.\d+)?)")
+_RE_BRAND_TOKEN = re.compile(r"\b[A-ZÁ-Ú]{3,}\b")
+_RE_VIS = re.compile(r"\b(\d{1,2})\s*[W]\s*(\d{2})\b", re.I)
+_RE_CAP = re.compile(r"\b(\d+[.,]?\d*)\s*(LITROS?|L|ML|M[L])\b", re.I)
+_RE_NUM34 = re.compile(r"\b\d{3,4}\+?\b")
+_RE_XCESS = re.compile(r"\bX[- ]?CESS\b")
+_RE_GEN2 = re.compile(r"\bGEN2\b")
+_RE_2T = re.compile(r"\b2T\b")
+_RE_C2PLUS = re.compile(r"\bC2\s*PLUS\b")
+_RE_C2 = re.compile(r"\bC2\b")
+_RE_CODE = re.compile(r"\b[A-Z]{1,3}\d{3,6}[A-Z]?\b")
+_RE_STOPWORDS = re.compile(r"\b(oleo|óleo|lubrificante|spray|de|do|da|para|off|road|sint[ée]tico|4t)\b", re.I)
+_RE_SPACES = re.compile(r"\s+")
+# Marcas numa única alternância (mais longas primeiro); se houver mais de uma no título,
+# vence a de maior prioridade, como na varredura original por `sorted(BRANDS, key=len)`
+_BRANDS_PRIO = {b: i for i, b in enumerate(sorted(BRANDS, key=len, reverse=True))}
+_RE_BRAND = re.compile("|".join(re.escape(b) for b in _BRANDS_PRIO))
+
 
 def base_dir() -> str:
     if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
@@ -105,8 +160,8 @@ def rand(a, b):
     return random.uniform(a, b)
 
 
-def rand_sleep(a, b):
-    time.sleep(rand(a, b))
+async def rand_sleep(a, b):
+    await asyncio.sleep(rand(a, b))
 
 
 def escolher_user_context():
@@ -117,125 +172,159 @@ def escolher_user_context():
     return ua, loc, {"width": vw, "height": vh}
 
 
-def aceitar_cookies(page):
+def user_context_do_perfil(profile_dir: str):
+    """Reaproveita UA/locale/viewport já usados no perfil, para os cookies salvos
+    continuarem batendo com a mesma "identidade" do navegador."""
+    path = os.path.join(profile_dir, "curvaA_identidade.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            d = json.load(f)
+        return d["ua"], d["locale"], d["viewport"]
+    except Exception:
+        pass
+    ua, loc, viewport = escolher_user_context()
+    try:
+        os.makedirs(profile_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"ua": ua, "locale": loc, "viewport": viewport}, f)
+    except Exception:
+        pass
+    return ua, loc, viewport
+
+
+async def bloquear_recursos(route):
+    req = route.request
+    if req.resource_type in BLOCKED_RESOURCE_TYPES or any(h in req.url for h in BLOCKED_URL_HINTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def aceitar_cookies(page, feitos: Optional[set] = None):
+    """Fecha o banner de cookies. Com `feitos`, tenta só uma vez por contexto: os cookies
+    valem para todas as abas do contexto (e, se o banner nem aparece, o perfil já aceitou)."""
+    if feitos is not None:
+        if page.context in feitos:
+            return
+        feitos.add(page.context)
     try:
-        page.get_by_role("button", name=re.compile("Aceitar|Entendi|Accept|Concordo|OK", re.I)).click(timeout=2000)
+        await page.get_by_role("button", name=_RE_COOKIES).click(timeout=2000)
     except Exception:
         pass
 
 
-def looks_like_antibot(page) -> bool:
+async def looks_like_antibot(page) -> bool:
     try:
-        txt = (page.inner_text("body") or "").lower()
+        txt = (await page.inner_text("body") or "").lower()
         return any(h in txt for h in ANTI_BOT_HINTS)
     except Exception:
         return False
 
 
-def wait_pdp_ready(page, timeout_ms=25000) -> bool:
+async def wait_pdp_ready(page, timeout_ms=10000) -> bool:
+    # Um único polling dentro da página (a cada 100 ms) testa todos os seletores de uma vez
     try:
-        page.wait_for_selector("h1.ui-pdp-title", state="visible", timeout=8000)
+        await page.wait_for_function(
+            "selectors => selectors.some(s => document.querySelector(s))",
+            arg=PDP_READY_SELECTORS, timeout=timeout_ms, polling=100,
+        )
         return True
     except PWTimeout:
-        pass
-    for sel in PDP_READY_SELECTORS:
-        try:
-            page.wait_for_selector(sel, state="visible", timeout=6000)
-            return True
-        except PWTimeout:
-            continue
-    for sel in PDP_READY_SELECTORS:
-        try:
-            page.wait_for_selector(sel, state="attached", timeout=5000)
-            return True
-        except PWTimeout:
-            continue
-    return False
+        return False
 
 
-def open_pdp(detail_page, link: str, shot_prefix="fails_pdp", attempt_max=3, log=None) -> bool:
+async def open_pdp(detail_page, link: str, shot_prefix="fails_pdp", attempt_max=3, log=None, debug_shots=False,
+                   cookies_feitos: Optional[set] = None) -> bool:
     for attempt in range(1, attempt_max + 1):
         try:
-            try:
-                detail_page.goto(link, wait_until="load", timeout=30000)
-            except PWTimeout:
-                detail_page.goto(link, wait_until="networkidle", timeout=30000)
+            # DOM pronto basta: wait_pdp_ready espera pelos seletores da PDP
+            await detail_page.goto(link, wait_until="domcontentloaded", timeout=15000)
 
             try:
-                aceitar_cookies(detail_page)
-                detail_page.mouse.wheel(0, 300); time.sleep(0.2); detail_page.mouse.wheel(0, 600)
+                await aceitar_cookies(detail_page, cookies_feitos)
+                await detail_page.mouse.wheel(0, 300); await asyncio.sleep(0.2); await detail_page.mouse.wheel(0, 600)
             except Exception:
                 pass
 
-            if looks_like_antibot(detail_page):
-                try:
-                    path = f"{shot_prefix}_antibot_{int(time.time())}.png"
-                    detail_page.screenshot(path=path, full_page=True)
-                except Exception:
-                    pass
+            if await looks_like_antibot(detail_page):
+                if debug_shots:
+                    try:
+                        path = f"{shot_prefix}_antibot_{int(time.time())}.png"
+                        await detail_page.screenshot(path=path, full_page=False)
+                    except Exception:
+                        pass
                 if log:
-                    log("🧱 Anti-bot na PDP; pulando link.")
+                    log("🧱 Anti-bot na PDP; pulando link.", logging.WARNING)
                 return False
 
-            if wait_pdp_ready(detail_page, timeout_ms=25000):
+            if await wait_pdp_ready(detail_page, timeout_ms=10000):
                 return True
 
             try:
-                detail_page.reload(wait_until="load", timeout=15000)
+                await detail_page.reload(wait_until="domcontentloaded", timeout=15000)
             except PWTimeout:
                 pass
-            if wait_pdp_ready(detail_page, timeout_ms=12000):
+            if await wait_pdp_ready(detail_page, timeout_ms=6000):
                 return True
 
-            try:
-                path = f"{shot_prefix}_{attempt}_{int(time.time())}.png"
-                detail_page.screenshot(path=path, full_page=True)
-            except Exception:
-                pass
+            if debug_shots:
+                try:
+                    path = f"{shot_prefix}_{attempt}_{int(time.time())}.png"
+                    await detail_page.screenshot(path=path, full_page=False)
+                except Exception:
+                    pass
             if log:
-                log(f"   🚫 PDP não ficou pronta (tentativa {attempt}/{attempt_max}).")
+                log(f"   🚫 PDP não ficou pronta (tentativa {attempt}/{attempt_max}).", logging.WARNING)
 
         except Exception as e:
             if log:
-                log(f"   ⚠️ Erro ao abrir PDP (tentativa {attempt}/{attempt_max}): {e}")
+                log(f"   ⚠️ Erro ao abrir PDP (tentativa {attempt}/{attempt_max}): {e}", logging.WARNING)
     return False
 
 
-def human_scroll(page, total_px=4000, step_px=(120, 300), jitter_px=30, top_pause=(0.2, 0.6)):
+async def human_scroll(page, total_px=4000, step_px=(120, 300), jitter_px=30, top_pause=(0.2, 0.6), stealth=False):
     if total_px <= 0:
         return
+    if not stealth:
+        # Uma rolagem só já dispara o lazy-load; stealth=True volta ao passo-a-passo com a roda do mouse
+        try:
+            await page.evaluate("(y) => window.scrollBy({top: y, left: 0, behavior: 'instant'})", total_px)
+        except Exception:
+            return
+        await rand_sleep(0.2, 0.5)
+        return
     scrolled = 0
     while scrolled < total_px:
         step = int(rand(*step_px)) + random.randint(-jitter_px, jitter_px)
         try:
-            page.mouse.wheel(0, step)
+            await page.mouse.wheel(0, step)
         except Exception:
             break
         scrolled += step
-        rand_sleep(*top_pause)
+        await rand_sleep(*top_pause)
 
 
-def human_move_mouse(page):
+async def human_move_mouse(page):
     try:
         w = page.viewport_size["width"]; h = page.viewport_size["height"]
         for _ in range(random.randint(2, 5)):
             x = random.randint(30, w - 30); y = random.randint(80, h - 80)
-            page.mouse.move(x, y, steps=random.randint(10, 30))
-            rand_sleep(0.05, 0.25)
+            await page.mouse.move(x, y, steps=random.randint(10, 30))
+            await rand_sleep(0.05, 0.25)
     except Exception:
         pass
 
 
-def mini_pausas():
+async def mini_pausas():
     if random.random() < 0.25:
-        rand_sleep(0.8, 2.0)
+        await rand_sleep(0.8, 2.0)
 
 
 def to_int(s: str, default=0):
     if not s:
         return default
     s2 = s.replace("\xa0", " ").replace("\u202f", " ").lower()
-    m = re.search(r"(\d[\d\.,]*)", s2)
+    m = _RE_INT.search(s2)
     if not m:
         return default
     num = m.group(1).replace(".", "").replace(",", "")
@@ -254,150 +343,156 @@ def parse_preco_texto_to_float(preco_txt: str):
         return None
 
 
-def get_cards(list_page):
-    cards = list_page.query_selector_all("li.poly-card, li.ui-search-layout__item")
-    if not cards:
-        cards = list_page.query_selector_all("a.ui-search-item__group__element.ui-search-link")
-    return cards or []
-
-
-def extrair_dados_card(card):
-    title_el = card.query_selector("a.poly-component__title, a.ui-search-link")
-    titulo = (title_el.inner_text().strip() if title_el else "").strip()
-    link = title_el.get_attribute("href") if title_el else None
+# Lê todos os cards da busca numa única chamada ao navegador (sem um RPC por seletor).
+# Já descarta links repetidos e para nos `firstN` primeiros.
+JS_EXTRACT_CARDS = """
+(firstN) => {
+    let cards = Array.from(document.querySelectorAll("li.poly-card, li.ui-search-layout__item"));
+    if (!cards.length) {
+        cards = Array.from(document.querySelectorAll("a.ui-search-item__group__element.ui-search-link"));
+    }
+    const txt = (root, sel) => {
+        const el = root.querySelector(sel);
+        return el ? (el.innerText || "").trim() : null;
+    };
+    const out = [];
+    const vistos = new Set();
+    for (const card of cards) {
+        const a = card.querySelector("a.poly-component__title, a.ui-search-link");
+        const link = a ? a.getAttribute("href") : null;
+        if (!link || vistos.has(link)) continue;
+        vistos.add(link);
+        const rv = card.querySelector("div.poly-component__reviews");
+        out.push({
+            titulo: a ? (a.innerText || "").trim() : "",
+            link: link,
+            patrocinado: !!card.querySelector(".poly-component__ads-promotions"),
+            nota: rv ? txt(rv, ".poly-reviews__rating") : null,
+            total: rv ? txt(rv, ".poly-reviews__total") : null,
+            frac: txt(card, "span.andes-money-amount__fraction, span.price-tag-fraction"),
+            cents: txt(card, "span.andes-money-amount__cents, span.price-tag-cents"),
+            desconto: txt(card, ".ui-search-price__discount, .poly-price__discount, .andes-money-amount__discount"),
+            parcelas: txt(card, "span.poly-price__installments"),
+        });
+        if (out.length >= firstN) break;
+    }
+    return {total: cards.length, cards: out};
+}
+"""
 
-    patrocinado = False
-    try:
-        if card.query_selector(".poly-component__ads-promotions"):
-            patrocinado = True
-    except Exception:
-        pass
 
+def montar_dados_card(raw: dict) -> dict:
     nota_media = None
-    total_avaliacoes = None
-    try:
-        rv = card.query_selector("div.poly-component__reviews")
-        if rv:
-            nota_txt = rv.query_selector(".poly-reviews__rating")
-            if nota_txt:
-                try:
-                    nota_media = float((nota_txt.inner_text() or "").strip().replace(",", "."))
-                except:
-                    pass
-            tot_txt = rv.query_selector(".poly-reviews__total")
-            if tot_txt:
-                total_avaliacoes = to_int(tot_txt.inner_text(), default=None)
-    except Exception:
-        pass
+    if raw.get("nota") is not None:
+        try:
+            nota_media = float(raw["nota"].replace(",", "."))
+        except:
+            pass
+
+    total_avaliacoes = to_int(raw.get("total"), default=None)
 
     preco_txt = None
-    try:
-        frac = card.query_selector("span.andes-money-amount__fraction, span.price-tag-fraction")
-        cents = card.query_selector("span.andes-money-amount__cents, span.price-tag-cents")
-        if frac:
-            preco_txt = frac.inner_text().strip()
-            if cents:
-                preco_txt = f"{preco_txt},{cents.inner_text().strip()}"
-    except Exception:
-        pass
+    if raw.get("frac") is not None:
+        preco_txt = raw["frac"]
+        if raw.get("cents") is not None:
+            preco_txt = f"{preco_txt},{raw['cents']}"
     preco_num = parse_preco_texto_to_float(preco_txt)
 
-    desconto_pct_txt = None
-    try:
-        desc_el = card.query_selector(".ui-search-price__discount, .poly-price__discount, .andes-money-amount__discount")
-        if desc_el:
-            desconto_pct_txt = (desc_el.inner_text() or "").strip()
-    except Exception:
-        pass
-
-    tipo_anuncio = "Clássico"
-    try:
-        inst = card.query_selector("span.poly-price__installments")
-        if inst and "sem juros" in (inst.inner_text() or "").lower():
-            tipo_anuncio = "Premium"
-    except Exception:
-        pass
+    tipo_anuncio = "Premium" if "sem juros" in (raw.get("parcelas") or "").lower() else "Clássico"
 
     return {
-        "Título": titulo,
-        "Link": link,
-        "Patrocinado": patrocinado,
+        "Título": raw.get("titulo") or "",
+        "Link": raw.get("link"),
+        "Patrocinado": bool(raw.get("patrocinado")),
         "Nota média (lista)": nota_media,
         "Nº avaliações (lista)": total_avaliacoes,
         "Preço (lista)": preco_txt,
         "Preço (lista num)": preco_num,
         "Preço promo (lista)": preco_txt,
-        "% desc (lista)": desconto_pct_txt,
+        "% desc (lista)": raw.get("desconto"),
         "Tipo (lista)": tipo_anuncio,
     }
 
 
-def parse_preco_pdp(page):
-    candidatos = [
-        "span.andes-money-amount__fraction",
-        "span.ui-pdp-price__second-line .andes-money-amount__fraction",
-        "span.price-tag-fraction",
-    ]
-    cents_sel = [
-        "span.andes-money-amount__cents",
-        "span.ui-pdp-price__second-line .andes-money-amount__cents",
-        "span.price-tag-cents",
-    ]
+# Lê preço/vendedor/vendidos/avaliações da PDP numa única chamada ao navegador,
+# com as mesmas cadeias de seletores de fallback de antes.
+JS_PDP = """
+() => {
+    const txt = (sels) => {
+        for (const s of sels) {
+            const el = document.querySelector(s);
+            if (el) return (el.innerText || "").trim();
+        }
+        return null;
+    };
+    let vendedor = null;
+    const btn = document.querySelector("button.ui-pdp-seller__link-trigger-button");
+    const spans = btn ? btn.querySelectorAll("span") : [];
+    if (spans.length > 1) {
+        vendedor = (spans[1].innerText || "").trim();
+    } else {
+        vendedor = txt(["a.ui-pdp-media__action"]);
+    }
+    return {
+        frac: txt([
+            "span.andes-money-amount__fraction",
+            "span.ui-pdp-price__second-line .andes-money-amount__fraction",
+            "span.price-tag-fraction",
+        ]),
+        cents: txt([
+            "span.andes-money-amount__cents",
+            "span.ui-pdp-price__second-line .andes-money-amount__cents",
+            "span.price-tag-cents",
+        ]),
+        vendedor: vendedor,
+        subtitulo: txt(["span.ui-pdp-subtitle"]),
+        nota: txt(["span.ui-review-summary__rating, .ui-pdp-review__rating__summary"]),
+        total: txt(["span.ui-review-summary__average, .ui-review-capabilities__count"]),
+    };
+}
+"""
+
+
+async def extrair_dados_pdp(page) -> dict:
+    raw = await page.evaluate(JS_PDP)
+
     preco_txt = None
-    for sel in candidatos:
-        el = page.query_selector(sel)
-        if el:
-            frac = (el.inner_text() or "").strip()
-            cents = None
-            for cs in cents_sel:
-                cel = page.query_selector(cs)
-                if cel:
-                    cents = (cel.inner_text() or "").strip()
-                    break
-            preco_txt = f"{frac},{cents}" if cents else frac
-            break
-    return preco_txt, parse_preco_texto_to_float(preco_txt)
+    if raw.get("frac") is not None:
+        preco_txt = f"{raw['frac']},{raw['cents']}" if raw.get("cents") else raw["frac"]
 
+    nota = None
+    if raw.get("nota"):
+        try:
+            nota = float(_RE_NOTA.search(raw["nota"].replace(",", ".")).group(1))
+        except:
+            pass
 
-def extrair_vendedor_pdp(page):
-    try:
-        el = page.query_selector("button.ui-pdp-seller__link-trigger-button")
-        if el:
-            spans = el.query_selector_all("span")
-            if len(spans) > 1:
-                return spans[1].inner_text().strip()
-        el = page.query_selector("a.ui-pdp-media__action")
-        if el:
-            return (el.inner_text() or "").strip()
-    except:
-        pass
-    return "Não encontrado"
+    return {
+        "preco_txt": preco_txt,
+        "preco_num": parse_preco_texto_to_float(preco_txt),
+        "vendedor": raw["vendedor"] if raw.get("vendedor") is not None else "Não encontrado",
+        "vendidos": str(to_int(raw.get("subtitulo") or "", default=0)),
+        "nota": nota,
+        "total": to_int(raw.get("total"), default=None),
+    }
 
 
-def extrair_vendidos_pdp(page):
-    el = page.query_selector("span.ui-pdp-subtitle")
-    txt = el.inner_text().strip() if el else ""
-    qtd = to_int(txt, default=0)
-    return str(qtd)
+async def parse_preco_pdp(page):
+    d = await extrair_dados_pdp(page)
+    return d["preco_txt"], d["preco_num"]
 
 
-def extrair_avaliacoes_pdp(page):
-    nota = None
-    total = None
-    try:
-        nota_el = page.query_selector("span.ui-review-summary__rating, .ui-pdp-review__rating__summary")
-        if nota_el:
-            ntxt = (nota_el.inner_text() or "").strip().replace(",", ".")
-            try:
-                nota = float(re.search(r"(\d+(\.\d+)?)", ntxt).group(1))
-            except:
-                pass
-        tot_el = page.query_selector("span.ui-review-summary__average, .ui-review-capabilities__count")
-        if tot_el:
-            total = to_int(tot_el.inner_text(), default=None)
-    except:
-        pass
-    return nota, total
+async def extrair_vendedor_pdp(page):
+    return (await extrair_dados_pdp(page))["vendedor"]
+
+
+async def extrair_vendidos_pdp(page):
+    return (await extrair_dados_pdp(page))["vendidos"]
+
+
+async def extrair_avaliacoes_pdp(page):
+    d = await extrair_dados_pdp(page)
+    return d["nota"], d["total"]
 
 
 def title_to_user_query(title: str) -> str:
@@ -409,24 +504,24 @@ def title_to_user_query(title: str) -> str:
 
     # Marca
     brand = None
-    for b in sorted(BRANDS, key=len, reverse=True):
-        if b in up:
-            brand = b.title()
-            up = up.replace(b, " ").strip()
-            break
+    achadas = _RE_BRAND.findall(up)
+    if achadas:
+        b = min(achadas, key=_BRANDS_PRIO.__getitem__)
+        brand = b.title()
+        up = up.replace(b, " ").strip()
     if not brand:
-        m = re.search(r"\b[A-ZÁ-Ú]{3,}\b", up)
+        m = _RE_BRAND_TOKEN.search(up)
         brand = (m.group(0).title() if m else "").strip()
 
     # Viscosidade
     vis = None
-    m = re.search(r"\b(\d{1,2})\s*[W]\s*(\d{2})\b", up, flags=re.I)
+    m = _RE_VIS.search(up)
     if m:
         vis = f"{m.group(1)}w{m.group(2)}"
 
     # Capacidade
     cap = None
-    m = re.search(r"\b(\d+[.,]?\d*)\s*(LITROS?|L|ML|M[L])\b", up, flags=re.I)
+    m = _RE_CAP.search(up)
     if m:
         qty = m.group(1).replace(",", ".")
         unit = m.group(2).upper()
@@ -451,24 +546,21 @@ def title_to_user_query(title: str) -> str:
                 cap = f"{qty} ml"
 
     # Tokens (modelos/códigos)
-    tokens = []
-    for pat in [r"\b\d{3,4}\+?\b"]:
-        for m in re.finditer(pat, up):
-            tokens.append(m.group(0))
+    tokens = [m.group(0) for m in _RE_NUM34.finditer(up)]
 
-    if re.search(r"\bX[- ]?CESS\b", up):
+    if _RE_XCESS.search(up):
         tokens.append("X-Cess")
-    if re.search(r"\bGEN2\b", up):
+    if _RE_GEN2.search(up):
         tokens.append("Gen2")
-    if re.search(r"\b2T\b", up):
+    if _RE_2T.search(up):
         tokens.append("2t")
-    if re.search(r"\bC2\s*PLUS\b", up):
+    if _RE_C2PLUS.search(up):
         tokens.append("C2 Plus")
-    elif re.search(r"\bC2\b", up):
+    elif _RE_C2.search(up):
         tokens.append("C2")
 
     # Filtros: códigos tipo PH6017A
-    m = re.search(r"\b[A-Z]{1,3}\d{3,6}[A-Z]?\b", up)
+    m = _RE_CODE.search(up)
     if m:
         code = m.group(0)
         base = " ".join([p for p in [brand, code] if p])
@@ -487,8 +579,8 @@ def title_to_user_query(title: str) -> str:
 
     consulta = " ".join([p for p in parts if p]).strip()
     if not consulta or consulta.lower() == (brand or "").lower():
-        cleaned = re.sub(r"\b(oleo|óleo|lubrificante|spray|de|do|da|para|off|road|sint[ée]tico|4t)\b", " ", s, flags=re.I)
-        cleaned = re.sub(r"\s+", " ", cleaned).strip()
+        cleaned = _RE_STOPWORDS.sub(" ", s)
+        cleaned = _RE_SPACES.sub(" ", cleaned).strip()
         return cleaned
     return consulta
 
@@ -497,20 +589,28 @@ def load_terms_from_excel(xlsx_path: str, sheet_name: Optional[str] = None) -> L
     import os
     ext = os.path.splitext(xlsx_path)[1].lower()
 
-    # CSV direto
+    # CSV direto: lê só a coluna A com o módulo csv, sem montar DataFrame.
+    # A 1ª linha é cabeçalho (igual ao pandas).
     if ext == ".csv":
-        df = pd.read_csv(xlsx_path)
-    else:
-        # Se NÃO informarem aba, use a primeira (0).
-        # Isso evita o retorno como dict quando sheet_name=None.
-        sheet_arg = 0 if (sheet_name is None or str(sheet_name).strip() == "") else sheet_name
-        df = pd.read_excel(xlsx_path, sheet_name=sheet_arg)
-
-        # Em casos raros alguém passa None e o pandas devolve dict; garanta DataFrame:
-        if isinstance(df, dict):
-            # pega a primeira aba disponível
-            first_key = next(iter(df.keys()))
-            df = df[first_key]
+        with open(xlsx_path, newline="", encoding="utf-8-sig") as f:
+            linhas = csv.reader(f)
+            next(linhas, None)
+            vals = (row[0].strip() for row in linhas if row)
+            return [v for v in vals if v not in NA_TEXTOS and v.lower() != "nan"]
+
+    # Se NÃO informarem aba, use a primeira (0).
+    # Isso evita o retorno como dict quando sheet_name=None.
+    sheet_arg = 0 if (sheet_name is None or str(sheet_name).strip() == "") else sheet_name
+    # calamine se instalado; senão o leitor padrão do pandas para a extensão
+    engine_kw = {"engine": EXCEL_ENGINE} if EXCEL_ENGINE else {}
+    # Só a coluna A é usada: não materializa as demais
+    df = pd.read_excel(xlsx_path, sheet_name=sheet_arg, usecols=[0], **engine_kw)
+
+    # Em casos raros alguém passa None e o pandas devolve dict; garanta DataFrame:
+    if isinstance(df, dict):
+        # pega a primeira aba disponível
+        first_key = next(iter(df.keys()))
+        df = df[first_key]
 
     # Se chegou até aqui e ainda não for DataFrame, falhe de forma amigável
     if not hasattr(df, "shape"):
@@ -520,40 +620,45 @@ def load_terms_from_excel(xlsx_path: str, sheet_name: Optional[str] = None) -> L
         return []
 
     # Coluna A (primeira coluna) é a fonte dos termos
-    col = df.columns[0]
-    termos = []
-    for x in df[col].tolist():
-        if pd.isna(x):
-            continue
-        s = str(x).strip()
-        if s and s.lower() != "nan":
-            termos.append(s)
-    return termos
-
-
-def comparar_precos_por_consulta(registros, nossas_lojas: set[str]):
-    if not registros:
-        return registros
-    nossas_upper = {s.upper() for s in nossas_lojas}
-    nossos = [r for r in registros if (r.get("Vendedor") or "").upper() in nossas_upper]
-    nosso_preco = None
-    if nossos:
-        nossos_precos = [r.get("Preço (num)") for r in nossos if isinstance(r.get("Preço (num)"), (int, float)) and r.get("Preço (num)") is not None]
-        if nossos_precos:
-            nosso_preco = min(nossos_precos)
-    for r in registros:
-        vendedor_up = (r.get("Vendedor") or "").upper()
-        r["É nossa loja?"] = "Sim" if vendedor_up in nossas_upper else "Não"
-        if nosso_preco is not None and r.get("Preço (num)") is not None and r["É nossa loja?"] == "Não":
-            r["Concorrente abaixo de nós?"] = "Sim" if r["Preço (num)"] < nosso_preco else "Não"
-            r["Nosso menor preço (num)"] = nosso_preco
-        else:
-            r["Concorrente abaixo de nós?"] = ""
-            r["Nosso menor preço (num)"] = nosso_preco if nosso_preco is not None else ""
-    return registros
+    s = df.iloc[:, 0].dropna().astype(str).str.strip()
+    s = s[(s != "") & (s.str.lower() != "nan")]
+    return s.tolist()
+
+
+def comparar_precos_por_consulta(df: pd.DataFrame, nossas_upper: frozenset) -> pd.DataFrame:
+    """Marca nossas lojas e concorrentes mais baratos, por "Termo original", sem laço por termo.
+
+    `nossas_upper` já vem em maiúsculas (JobConfig.nossas_upper).
+    """
+    if df.empty or not nossas_upper:
+        df["É nossa loja?"] = "Não"
+        df["Concorrente abaixo de nós?"] = ""
+        df["Nosso menor preço (num)"] = ""
+        return df
+    mask_ours = df["Vendedor"].fillna("").astype(str).str.upper().isin(nossas_upper)
+    preco = pd.to_numeric(df["Preço (num)"], errors="coerce")
+    nosso_min = preco.where(mask_ours).groupby(df["Termo original"], sort=False).transform("min")
+
+    comparavel = (~mask_ours) & nosso_min.notna() & preco.notna()
+    df["É nossa loja?"] = np.where(mask_ours, "Sim", "Não")
+    df["Concorrente abaixo de nós?"] = np.where(comparavel, np.where(preco < nosso_min, "Sim", "Não"), "")
+    df["Nosso menor preço (num)"] = nosso_min.astype(object).where(nosso_min.notna(), "")
+    return df
 
 
 # ========================= Thread do Scraper =========================
+# Colunas de cada linha coletada (também o cabeçalho do CSV parcial)
+COLUNAS_COLETA = [
+    "Termo original","Consulta","Patrocinado","Título","Preço","Preço (num)","Preço promo (lista)",
+    "% desc (lista)","Tipo anúncio","Vendedor","Vendidos (PDP)","Nota média","Nº avaliações","Link",
+]
+
+
+def linha_csv_ptbr(linha: dict) -> dict:
+    """Floats com vírgula decimal: o CSV parcial (";" + BOM) é aberto direto no Excel pt-BR."""
+    return {k: (str(v).replace(".", ",") if isinstance(v, float) else v) for k, v in linha.items()}
+
+
 @dataclass
 class JobConfig:
     xlsx_path: str
@@ -563,21 +668,75 @@ class JobConfig:
     raw_queries: bool
     mini_pausas: bool
     scroll_pages: bool
-    nossas_lojas: set
+    nossas_lojas: frozenset
     out_dir: str
+    workers: int = DEFAULT_WORKERS
+    debug_shots: bool = DEFAULT_DEBUG_SHOTS  # screenshots das PDPs que falharem
+    nossas_upper: frozenset = field(init=False, default=frozenset())
+
+    def __post_init__(self):
+        # Normalizado uma vez por job; a comparação por linha é só um `in`
+        self.nossas_upper = frozenset(s.upper() for s in self.nossas_lojas)
+
+
+class ProgressoSlot:
+    """Caixa de correio "último vence" para (atual, total): a thread sobrescreve, a GUI lê uma vez por ciclo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._valor = None
+
+    def put(self, valor):
+        with self._lock:
+            self._valor = valor
+
+    def take(self):
+        """Retorna o último valor publicado desde a leitura anterior (ou None)."""
+        with self._lock:
+            valor, self._valor = self._valor, None
+        return valor
 
 
 class ScraperThread(threading.Thread):
-    def __init__(self, cfg: JobConfig, log_q: queue.Queue, progress_q: queue.Queue, stop_evt: threading.Event):
+    def __init__(self, cfg: JobConfig, progress: ProgressoSlot, stop_evt: threading.Event):
         super().__init__(daemon=True)
         self.cfg = cfg
-        self.log_q = log_q
-        self.progress_q = progress_q
+        self.progress = progress
         self.stop_evt = stop_evt
+        self._cookies_feitos: set = set()  # contextos cujo banner de cookies já foi tratado
+        self._delay = THROTTLE_START  # pausa base entre termos (s), compartilhada pelos contextos
+        # Caches só desta execução (preços mudam; nada é gravado em disco)
+        self._search_cache: dict = {}  # (consulta, first_n) -> Future[cards selecionados | None]
+        self._pdp_cache: dict = {}     # link -> Future[dados da PDP | None]
+
+    def log(self, msg: str, level: int = logging.INFO):
+        logger.log(level, msg)
+
+    # Os caches guardam um Future por chave: quem chega enquanto a busca/PDP ainda está em
+    # andamento (termo ou link repetido em outro slot) espera por ela em vez de repetir a visita.
+    @staticmethod
+    async def _aguardar_cache(cache: dict, chave):
+        """Valor já obtido (ou em andamento) para `chave`; None se ninguém conseguiu."""
+        pendente = cache.get(chave)
+        while pendente is not None:
+            valor = await pendente
+            if valor is not None:
+                return valor
+            pendente = cache.get(chave)  # tentativa anterior falhou; outra pode ter começado
+        return None
+
+    @staticmethod
+    def _reservar_cache(cache: dict, chave) -> asyncio.Future:
+        pendente = asyncio.get_running_loop().create_future()
+        cache[chave] = pendente
+        return pendente
 
-    def log(self, msg: str):
-        ts = datetime.now().strftime("%H:%M:%S")
-        self.log_q.put(f"[{ts}] {msg}")
+    @staticmethod
+    def _concluir_cache(cache: dict, chave, pendente: asyncio.Future, valor):
+        # Falha (None) sai do cache para a próxima chamada tentar de novo
+        if valor is None:
+            cache.pop(chave, None)
+        pendente.set_result(valor)
 
     def run(self):
         try:
@@ -587,158 +746,30 @@ class ScraperThread(threading.Thread):
             total = len(termos)
             if total == 0:
                 self.log("Excel sem termos na coluna A.")
-                self.progress_q.put((0, 0))
+                self.progress.put((0, 0))
                 return
 
-            todos = []
-            parcial_path = os.path.join(self.cfg.out_dir, "resultado_curvaA_parcial.xlsx")
+            parcial_path = os.path.join(self.cfg.out_dir, "resultado_curvaA_parcial.csv")
             final_path = os.path.join(self.cfg.out_dir, "resultado_curvaA.xlsx")
             os.makedirs(self.cfg.out_dir, exist_ok=True)
 
-            with sync_playwright() as p:
-                ua, loc, viewport = escolher_user_context()
-                browser = p.chromium.launch(headless=self.cfg.headless)
-                context = browser.new_context(locale=loc, user_agent=ua, viewport=viewport)
-                list_page = context.new_page()
-                detail_page = context.new_page()
-
-                self.log(f"🌐 UA: {ua[:55]}… | locale: {loc} | viewport: {viewport}")
-
-                for idx, termo in enumerate(termos, start=1):
-                    if self.stop_evt.is_set():
-                        self.log("🛑 Interrompido pelo usuário.")
-                        break
-
-                    consulta = termo.strip() if self.cfg.raw_queries else title_to_user_query(termo)
-                    if not consulta:
-                        self.log(f"⚠️ Termo vazio/inalcançável: {termo}")
-                        self.progress_q.put((idx, total))
-                        continue
-
-                    url = SEARCH_BASE + urllib.parse.quote_plus(consulta)
-                    self.log(f"🔎 {termo}  →  {consulta}")
-                    self.log(f"    {url}")
-
-                    try:
-                        list_page.goto(url, wait_until="domcontentloaded", timeout=30000)
-                        aceitar_cookies(list_page)
-                        list_page.wait_for_selector("main", timeout=15000)
-                    except PWTimeout:
-                        self.log("⏱️ Timeout na busca; pulando termo.")
-                        self.progress_q.put((idx, total))
-                        continue
-
-                    if self.cfg.scroll_pages:
-                        human_move_mouse(list_page)
-                        human_scroll(list_page, total_px=random.randint(1500, 3000))
-                    if self.cfg.mini_pausas:
-                        mini_pausas()
-
-                    cards = get_cards(list_page)
-                    self.log(f"🧩 {len(cards)} cards encontrados")
-                    if not cards:
-                        self.progress_q.put((idx, total))
-                        continue
-
-                    selecionados = []
-                    vistos_links = set()
-                    for i, card in enumerate(cards, start=1):
-                        if self.stop_evt.is_set():
-                            break
-                        try:
-                            box = None
-                            try:
-                                box = card.bounding_box()
-                            except Exception:
-                                pass
-                            if box:
-                                list_page.mouse.move(
-                                    box["x"] + box["width"]/2 + random.randint(-15, 15),
-                                    box["y"] + box["height"]/2 + random.randint(-8, 8),
-                                    steps=random.randint(8, 20)
-                                )
-                                time.sleep(0.1)
-
-                            base = extrair_dados_card(card)
-                            link = base.get("Link")
-                            if not link or link in vistos_links:
-                                continue
-                            vistos_links.add(link)
-                            selecionados.append(base)
-                            if len(selecionados) >= self.cfg.first_n:
-                                break
-                        except Exception as e:
-                            self.log(f"❌ Erro no card {i}: {e}")
-
-                    if not selecionados:
-                        self.progress_q.put((idx, total))
-                        continue
-
-                    self.log(f"➡️ Processando os {len(selecionados)} primeiros…")
-
-                    try:
-                        for j, base in enumerate(selecionados, 1):
-                            if self.stop_evt.is_set():
-                                break
-                            self.log(f"   → ({j}/{len(selecionados)}) {base.get('Título','')[:90]}")
-                            ok = open_pdp(detail_page, base["Link"], shot_prefix=f"pdp_{int(time.time())}", attempt_max=3, log=self.log)
-                            if not ok:
-                                self.log("     ❌ Falha ao abrir PDP; seguindo.")
-                                continue
-
-                            if self.cfg.scroll_pages:
-                                human_move_mouse(detail_page)
-                                human_scroll(detail_page, total_px=random.randint(900, 1600))
-                            if self.cfg.mini_pausas:
-                                mini_pausas()
-
-                            preco_pdp_txt, preco_pdp_num = parse_preco_pdp(detail_page)
-                            vendedor = extrair_vendedor_pdp(detail_page)
-                            vendidos = extrair_vendidos_pdp(detail_page)
-                            nota_pdp, total_pdp = extrair_avaliacoes_pdp(detail_page)
-
-                            preco_txt_final = base["Preço (lista)"] or preco_pdp_txt
-                            preco_num_final = base["Preço (lista num)"] if base["Preço (lista num)"] is not None else preco_pdp_num
-                            nota_final = base["Nota média (lista)"] if base["Nota média (lista)"] is not None else nota_pdp
-                            total_av_final = base["Nº avaliações (lista)"] if base["Nº avaliações (lista)"] is not None else total_pdp
-
-                            todos.append({
-                                "Termo original": termo,
-                                "Consulta": consulta,
-                                "Patrocinado": "Sim" if base["Patrocinado"] else "Não",
-                                "Título": base["Título"],
-                                "Preço": preco_txt_final,
-                                "Preço (num)": preco_num_final,
-                                "Preço promo (lista)": base["Preço promo (lista)"],
-                                "% desc (lista)": base["% desc (lista)"],
-                                "Tipo anúncio": base["Tipo (lista)"],
-                                "Vendedor": vendedor,
-                                "Vendidos (PDP)": vendidos,
-                                "Nota média": nota_final,
-                                "Nº avaliações": total_av_final,
-                                "Link": base["Link"],
-                            })
-
-                            time.sleep(rand(0.6, 1.6))
-
-                        # parcial por termo
-                        if todos:
-                            df_parcial = pd.DataFrame(todos)
-                            df_parcial.to_excel(parcial_path, index=False)
-                            self.log(f"💾 Parcial salva → {parcial_path}")
-
-                    except Exception as e:
-                        self.log(f"⚠️ Erro ao processar PDPs: {e}")
-
-                    self.progress_q.put((idx, total))
-                    # pausa entre termos
-                    time.sleep(rand(2.5, 5.5))
-
-                browser.close()
+            # Parcial em CSV só-append: cada termo grava apenas as suas linhas.
+            # Se o arquivo estiver travado (ex.: aberto no Excel), a coleta segue sem parcial.
+            try:
+                fparcial = open(parcial_path, "w", newline="", encoding="utf-8-sig")
+            except OSError as e:
+                self.log(f"⚠️ Não foi possível abrir a parcial ({e}); seguindo sem ela.", logging.WARNING)
+                fparcial = None
+            # Playwright assíncrono: um event loop próprio dentro desta thread
+            try:
+                todos = asyncio.run(self._coletar(termos, fparcial))
+            finally:
+                if fparcial is not None:
+                    fparcial.close()
 
             if not todos:
                 self.log("📭 Nenhum resultado coletado.")
-                self.progress_q.put((total, total))
+                self.progress.put((total, total))
                 return
 
             # Ordenar e comparar
@@ -751,12 +782,7 @@ class ScraperThread(threading.Thread):
             ).drop(columns=["Nota média (ord)", "Nº avaliações (ord)"])
 
             # Comparação de preços por consulta
-            registros_cmp = []
-            for termo in df["Termo original"].unique():
-                bloco = df[df["Termo original"] == termo].to_dict("records")
-                bloco2 = comparar_precos_por_consulta(bloco, self.cfg.nossas_lojas)
-                registros_cmp.extend(bloco2)
-            df_final = pd.DataFrame(registros_cmp)
+            df_final = comparar_precos_por_consulta(df.reset_index(drop=True), self.cfg.nossas_upper)
 
             cols = [
                 "Termo original","Consulta","Patrocinado","Tipo anúncio","É nossa loja?","Concorrente abaixo de nós?",
@@ -768,27 +794,268 @@ class ScraperThread(threading.Thread):
 
             df_final.to_excel(final_path, index=False)
             self.log(f"🏁 Finalizado. Arquivo salvo: {final_path}")
-            self.progress_q.put((total, total))
+            self.progress.put((total, total))
+
+        except Exception as e:
+            self.log("❌ Erro fatal:\n" + traceback.format_exc(), logging.ERROR)
+            self.progress.put((0, 0))
+
+    async def _coletar(self, termos: List[str], fparcial) -> list:
+        """Processa os termos em paralelo, limitado a `cfg.workers` contextos simultâneos."""
+        total = len(termos)
+        todos = []
+        feitos = 0
+        parcial = None
+        if fparcial is not None:
+            parcial = csv.DictWriter(fparcial, fieldnames=COLUNAS_COLETA, delimiter=";")
+            try:
+                parcial.writeheader()
+            except OSError as e:
+                self.log(f"⚠️ Erro ao gravar a parcial ({e}); seguindo sem ela.", logging.WARNING)
+                parcial = None
+
+        async with async_playwright() as p:
+            # Pool de contextos (cada um com UA/locale/viewport próprios) e suas duas abas.
+            # Cada contexto roda no seu próprio processo do Chromium, então um navegador
+            # lento/travado não segura os demais. Os perfis ficam em disco (out_dir/.pwprofile)
+            # e são reaproveitados entre execuções, mas só cookies/sessão passam adiante: com
+            # context.route ativo o Playwright desliga o cache HTTP. O Chromium ainda é aberto
+            # do zero a cada Iniciar (o custo de partida não é amortizado).
+            contexts = []
+            slots: asyncio.Queue = asyncio.Queue()
+            for k in range(1, max(1, self.cfg.workers) + 1):
+                profile_dir = os.path.join(self.cfg.out_dir, ".pwprofile", f"ctx{k}")
+                ua, loc, viewport = user_context_do_perfil(profile_dir)
+                context = await p.chromium.launch_persistent_context(
+                    profile_dir, headless=self.cfg.headless, locale=loc, user_agent=ua, viewport=viewport,
+                )
+                contexts.append(context)
+                await context.route("**/*", bloquear_recursos)
+                list_page = context.pages[0] if context.pages else await context.new_page()
+                slots.put_nowait((list_page, await context.new_page()))
+                self.log(f"🌐 Contexto {k}: UA: {ua[:55]}… | locale: {loc} | viewport: {viewport}", logging.DEBUG)
+
+            async def process_term(idx: int, termo: str):
+                nonlocal feitos
+                list_page, detail_page = await slots.get()
+                try:
+                    if self.stop_evt.is_set():
+                        return
+                    try:
+                        linhas, bloqueio = await self._processar_termo(list_page, detail_page, idx, total, termo)
+                    except Exception as e:
+                        self.log(f"[{idx}/{total}] ⚠️ Erro no termo {termo}: {e}", logging.WARNING)
+                        linhas, bloqueio = [], True
+
+                    if linhas:
+                        todos.extend(linhas)
+                        # parcial por termo; falha de disco não interrompe a coleta
+                        if parcial is not None:
+                            try:
+                                parcial.writerows(map(linha_csv_ptbr, linhas))
+                                fparcial.flush()
+                                self.log(f"💾 Parcial salva → {fparcial.name}", logging.DEBUG)
+                            except OSError as e:
+                                self.log(f"[{idx}/{total}] ⚠️ Erro ao salvar parcial: {e}", logging.WARNING)
+
+                    feitos += 1
+                    self.progress.put((feitos, total))
+                    # pausa entre termos (por contexto), ajustada pelo que aconteceu neste termo
+                    if bloqueio:
+                        self._delay = min(self._delay * 2, THROTTLE_MAX)
+                        self.log(f"🐢 Timeouts/anti-bot; pausa entre termos agora ~{self._delay:.1f}s", logging.WARNING)
+                    else:
+                        self._delay = max(self._delay * 0.7, THROTTLE_MIN)
+                    if not self.stop_evt.is_set():
+                        await asyncio.sleep(rand(self._delay, self._delay * 1.3))
+                finally:
+                    slots.put_nowait((list_page, detail_page))
+
+            await asyncio.gather(*(process_term(i, t) for i, t in enumerate(termos, start=1)))
+            if self.stop_evt.is_set():
+                self.log("🛑 Interrompido pelo usuário.")
+
+            for context in contexts:
+                await context.close()
+
+        return todos
+
+    async def _processar_termo(self, list_page, detail_page, idx: int, total: int, termo: str):
+        """Retorna (linhas coletadas, houve timeout/anti-bot neste termo)."""
+        def log(msg: str, level: int = logging.INFO):
+            self.log(f"[{idx}/{total}] {msg}", level)
+
+        consulta = termo.strip() if self.cfg.raw_queries else title_to_user_query(termo)
+        if not consulta:
+            log(f"⚠️ Termo vazio/inalcançável: {termo}", logging.WARNING)
+            return [], False
+
+        chave_busca = (consulta, self.cfg.first_n)
+        selecionados = await self._aguardar_cache(self._search_cache, chave_busca)
+        if selecionados is not None:
+            log(f"♻️ {termo}  →  {consulta} (busca em cache: {len(selecionados)} cards)")
+        else:
+            pendente = self._reservar_cache(self._search_cache, chave_busca)
+            try:
+                url = SEARCH_BASE + urllib.parse.quote_plus(consulta)
+                log(f"🔎 {termo}  →  {consulta}")
+                log(f"    {url}", logging.DEBUG)
+
+                try:
+                    await list_page.goto(url, wait_until="domcontentloaded", timeout=20000)
+                    await aceitar_cookies(list_page, self._cookies_feitos)
+                    await list_page.wait_for_selector("main", timeout=15000)
+                except PWTimeout:
+                    log("⏱️ Timeout na busca; pulando termo.", logging.WARNING)
+                    return [], True
+
+                if self.cfg.scroll_pages:
+                    await human_move_mouse(list_page)
+                    await human_scroll(list_page, total_px=random.randint(1500, 3000))
+                if self.cfg.mini_pausas:
+                    await mini_pausas()
+
+                try:
+                    extraido = await list_page.evaluate(JS_EXTRACT_CARDS, self.cfg.first_n)
+                except Exception as e:
+                    log(f"❌ Erro ao ler os cards: {e}", logging.WARNING)
+                    return [], False
+                log(f"🧩 {extraido['total']} cards encontrados", logging.DEBUG)
+
+                selecionados = [montar_dados_card(raw) for raw in extraido["cards"]] or None
+
+                if selecionados is None:
+                    return [], await looks_like_antibot(list_page)
+            finally:
+                self._concluir_cache(self._search_cache, chave_busca, pendente, selecionados)
+
+        log(f"➡️ Processando os {len(selecionados)} primeiros…", logging.DEBUG)
+
+        linhas = []
+        falhas = 0
+        try:
+            for j, base in enumerate(selecionados, 1):
+                if self.stop_evt.is_set():
+                    break
+                log(f"   → ({j}/{len(selecionados)}) {base.get('Título','')[:90]}", logging.DEBUG)
+                pdp = await self._aguardar_cache(self._pdp_cache, base["Link"])
+                em_cache = pdp is not None
+                if em_cache:
+                    log("     ♻️ PDP em cache.", logging.DEBUG)
+                else:
+                    pendente = self._reservar_cache(self._pdp_cache, base["Link"])
+                    try:
+                        ok = await open_pdp(detail_page, base["Link"], shot_prefix=f"pdp_{int(time.time())}", attempt_max=3, log=log,
+                                            debug_shots=self.cfg.debug_shots, cookies_feitos=self._cookies_feitos)
+                        if ok:
+                            if self.cfg.scroll_pages:
+                                await human_move_mouse(detail_page)
+                                await human_scroll(detail_page, total_px=random.randint(900, 1600))
+                            if self.cfg.mini_pausas:
+                                await mini_pausas()
+
+                            pdp = await extrair_dados_pdp(detail_page)
+                    finally:
+                        self._concluir_cache(self._pdp_cache, base["Link"], pendente, pdp)
+                    if pdp is None:
+                        falhas += 1
+                        log("     ❌ Falha ao abrir PDP; seguindo.", logging.WARNING)
+                        continue
+                preco_pdp_txt, preco_pdp_num = pdp["preco_txt"], pdp["preco_num"]
+                vendedor, vendidos = pdp["vendedor"], pdp["vendidos"]
+                nota_pdp, total_pdp = pdp["nota"], pdp["total"]
+
+                preco_txt_final = base["Preço (lista)"] or preco_pdp_txt
+                preco_num_final = base["Preço (lista num)"] if base["Preço (lista num)"] is not None else preco_pdp_num
+                nota_final = base["Nota média (lista)"] if base["Nota média (lista)"] is not None else nota_pdp
+                total_av_final = base["Nº avaliações (lista)"] if base["Nº avaliações (lista)"] is not None else total_pdp
+
+                linhas.append({
+                    "Termo original": termo,
+                    "Consulta": consulta,
+                    "Patrocinado": "Sim" if base["Patrocinado"] else "Não",
+                    "Título": base["Título"],
+                    "Preço": preco_txt_final,
+                    "Preço (num)": preco_num_final,
+                    "Preço promo (lista)": base["Preço promo (lista)"],
+                    "% desc (lista)": base["% desc (lista)"],
+                    "Tipo anúncio": base["Tipo (lista)"],
+                    "Vendedor": vendedor,
+                    "Vendidos (PDP)": vendidos,
+                    "Nota média": nota_final,
+                    "Nº avaliações": total_av_final,
+                    "Link": base["Link"],
+                })
+
+                if not em_cache:
+                    await asyncio.sleep(rand(0.6, 1.6))
 
         except Exception as e:
-            self.log("❌ Erro fatal:\n" + traceback.format_exc())
-            self.progress_q.put((0, 0))
+            log(f"⚠️ Erro ao processar PDPs: {e}", logging.WARNING)
+            falhas += 1
+
+        return linhas, falhas > 0
 
 
 # ========================= GUI (Tkinter) =========================
+# isdir/isfile com TTL curto: cliques repetidos não voltam ao disco. `bucket` muda a cada
+# FS_CACHE_TTL_S segundos, invalidando as entradas antigas.
+def _fs_bucket() -> int:
+    return int(time.monotonic() // FS_CACHE_TTL_S)
+
+
+@functools.lru_cache(maxsize=32)
+def _isdir_cached(path: str, bucket: int) -> bool:
+    return os.path.isdir(path)
+
+
+@functools.lru_cache(maxsize=32)
+def _isfile_cached(path: str, bucket: int) -> bool:
+    return os.path.isfile(path)
+
+
+class FilaLogHandler(logging.handlers.QueueHandler):
+    """Enfileira o registro como veio, sem formatar nem copiar na thread do scraper.
+    A fila é uma SimpleQueue em memória (nada é serializado), então é seguro."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class TkLogHandler(logging.Handler):
+    """Formata os registros vindos da fila; o App insere as linhas no Text em lote."""
+
+    def __init__(self):
+        super().__init__()
+        self.pendentes: List[str] = []
+        self.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%H:%M:%S"))
+
+    def emit(self, record: logging.LogRecord):
+        self.pendentes.append(self.format(record))
+
+
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Curva A – Scraper ML")
         self.geometry("780x620")
 
-        self.log_q: queue.Queue = queue.Queue()
-        self.progress_q: queue.Queue = queue.Queue()
+        # Produtor/consumidor únicos: SimpleQueue basta (sem task_done/join, menos locks por item)
+        self.log_q: queue.SimpleQueue = queue.SimpleQueue()
+        self.progress = ProgressoSlot()
+        # Scraper → fila (put_nowait, sem formatar); GUI → TkLogHandler em _poll_queues
+        logger.addHandler(FilaLogHandler(self.log_q))
+        self._log_handler = TkLogHandler()
+        self._line_count = 0  # linhas atualmente no Text do log
+        self._poll_iv = POLL_MIN_MS
+        self._rodando = False
+        self._prog_max = None  # `maximum` atual da barra de progresso (= total de termos)
+        self._validate_after = None  # id do after() pendente da validação
         self.stop_evt = threading.Event()
         self.worker: Optional[ScraperThread] = None
 
         self._build_ui()
-        self.after(150, self._poll_queues)
+        self.after(self._poll_iv, self._poll_queues)
 
     def _build_ui(self):
         pad = {"padx": 8, "pady": 6}
@@ -831,6 +1098,16 @@ class App(tk.Tk):
         self.var_lojas = tk.StringVar(value="Lojas que deseja monitorar")
         ttk.Entry(opt, textvariable=self.var_lojas, width=30).grid(row=1, column=3, sticky="we")
 
+        self.var_workers = tk.IntVar(value=DEFAULT_WORKERS)
+        ttk.Label(opt, text="Navegadores em paralelo:").grid(row=2, column=0, sticky="w", **pad)
+        ttk.Spinbox(opt, from_=1, to=10, width=6, textvariable=self.var_workers).grid(row=2, column=1, sticky="w")
+
+        self.var_debug_shots = tk.BooleanVar(value=DEFAULT_DEBUG_SHOTS)
+        ttk.Checkbutton(opt, text="Screenshots de falhas (debug)", variable=self.var_debug_shots).grid(row=2, column=2, sticky="w")
+
+        self.var_log_detalhado = tk.BooleanVar(value=DEFAULT_LOG_DETALHADO)
+        ttk.Checkbutton(opt, text="Log detalhado (cada PDP)", variable=self.var_log_detalhado).grid(row=2, column=3, sticky="w")
+
         # Linha 3: Saída
         outf = ttk.LabelFrame(self, text="Saída")
         outf.pack(fill=tk.X, expand=False, **pad)
@@ -857,7 +1134,27 @@ class App(tk.Tk):
         logf.pack(fill=tk.BOTH, expand=True, **pad)
         self.txt = tk.Text(logf, height=18, wrap="word")
         self.txt.pack(fill=tk.BOTH, expand=True)
-        self.txt.config(state=tk.DISABLED)
+        # Marca fixa no fim do log (gravidade à direita: acompanha cada insert)
+        self.txt.mark_set("log_end", tk.END)
+        self.txt.mark_gravity("log_end", tk.RIGHT)
+        # Fica sempre NORMAL (sem alternar state a cada insert); a edição é bloqueada nos bindings
+        self.txt.bind("<Key>", self._log_key)
+        for ev in ("<<Paste>>", "<<Cut>>", "<<PasteSelection>>", "<<Clear>>"):
+            self.txt.bind(ev, lambda e: "break")
+
+        # Todas as variáveis do formulário, lidas de uma vez em _start
+        self._vars = {
+            "excel": self.var_excel, "sheet": self.var_sheet, "firstn": self.var_firstn,
+            "headless": self.var_headless, "raw": self.var_raw, "scroll": self.var_scroll,
+            "minipause": self.var_minipause, "lojas": self.var_lojas, "outdir": self.var_outdir,
+            "workers": self.var_workers, "debug_shots": self.var_debug_shots,
+            "log_detalhado": self.var_log_detalhado,
+        }
+
+        # "Iniciar" só fica habilitado com Excel e pasta de saída válidos (validação com debounce)
+        self.var_excel.trace_add("write", self._schedule_validate)
+        self.var_outdir.trace_add("write", self._schedule_validate)
+        self._validate()
 
     # ----- helpers UI -----
     def _choose_excel(self):
@@ -872,91 +1169,162 @@ class App(tk.Tk):
 
     def _open_outdir(self):
         path = self.var_outdir.get().strip()
-        if path and os.path.isdir(path):
+        if path and _isdir_cached(path, _fs_bucket()):
             if sys.platform.startswith("win"):
                 os.startfile(path)
-            elif sys.platform == "darwin":
-                os.system(f"open '{path}'")
             else:
-                os.system(f"xdg-open '{path}'")
+                # Sem shell (caminhos com aspas não quebram) e sem bloquear a GUI
+                cmd = ["open", path] if sys.platform == "darwin" else ["xdg-open", path]
+                try:
+                    subprocess.Popen(cmd)
+                except FileNotFoundError:
+                    messagebox.showinfo("Pasta", f"Não foi possível abrir a pasta:\n{path}")
         else:
             messagebox.showinfo("Pasta", "Pasta de saída inexistente.")
 
     def _toggle_controls(self, running: bool):
-        self.btn_start.config(state=tk.DISABLED if running else tk.NORMAL)
+        self._rodando = running
+        self.btn_start.config(state=tk.DISABLED if running or not self._inputs_ok() else tk.NORMAL)
         self.btn_stop.config(state=tk.NORMAL if running else tk.DISABLED)
 
-    def _start(self):
+    def _inputs_ok(self) -> bool:
         xlsx = self.var_excel.get().strip()
-        if not xlsx or not os.path.isfile(xlsx):
+        return bool(xlsx) and _isfile_cached(xlsx, _fs_bucket()) and bool(self.var_outdir.get().strip())
+
+    def _schedule_validate(self, *_):
+        # Coalesce digitação: só valida 300 ms após a última alteração
+        if self._validate_after is not None:
+            self.after_cancel(self._validate_after)
+        self._validate_after = self.after(300, self._validate)
+
+    def _validate(self):
+        self._validate_after = None
+        if not self._rodando:
+            self.btn_start.config(state=tk.NORMAL if self._inputs_ok() else tk.DISABLED)
+
+    def _start(self):
+        if self.worker and self.worker.is_alive():
+            messagebox.showwarning("Coleta", "Aguarde a coleta anterior terminar.")
+            return
+
+        # Um snapshot do formulário: cada .get() é uma ida e volta ao Tcl
+        vals = {k: v.get() for k, v in self._vars.items()}
+
+        xlsx = vals["excel"].strip()
+        if not xlsx or not _isfile_cached(xlsx, _fs_bucket()):
             messagebox.showerror("Arquivo", "Selecione um Excel válido.")
             return
-        outdir = self.var_outdir.get().strip()
+        outdir = vals["outdir"].strip()
         if not outdir:
             messagebox.showerror("Saída", "Defina a pasta de saída.")
             return
 
-        lojas = set([s.strip() for s in self.var_lojas.get().split(";") if s.strip()])
+        lojas = frozenset(filter(None, map(str.strip, vals["lojas"].split(";"))))
         cfg = JobConfig(
             xlsx_path=xlsx,
-            sheet_name=(self.var_sheet.get().strip() or None),
-            first_n=max(1, int(self.var_firstn.get() or 5)),
-            headless=bool(self.var_headless.get()),
-            raw_queries=bool(self.var_raw.get()),
-            mini_pausas=bool(self.var_minipause.get()),
-            scroll_pages=bool(self.var_scroll.get()),
+            sheet_name=(vals["sheet"].strip() or None),
+            first_n=max(1, int(vals["firstn"] or 5)),
+            headless=bool(vals["headless"]),
+            raw_queries=bool(vals["raw"]),
+            mini_pausas=bool(vals["minipause"]),
+            scroll_pages=bool(vals["scroll"]),
             nossas_lojas=lojas,
             out_dir=outdir,
+            workers=max(1, int(vals["workers"] or DEFAULT_WORKERS)),
+            debug_shots=bool(vals["debug_shots"]),
         )
 
+        logger.setLevel(logging.DEBUG if vals["log_detalhado"] else logging.INFO)
+
         self.stop_evt.clear()
         self._toggle_controls(True)
         self._log_clear()
         self._log("Iniciando…")
         self.prog.config(value=0, maximum=100)
+        self._prog_max = None
 
-        self.worker = ScraperThread(cfg, self.log_q, self.progress_q, self.stop_evt)
+        self.worker = ScraperThread(cfg, self.progress, self.stop_evt)
         self.worker.start()
 
     def _stop(self):
         if self.worker and self.worker.is_alive():
             self.stop_evt.set()
             self._log("Solicitada parada. Aguardando o lote atual…")
-        self._toggle_controls(False)
+            # Iniciar só volta quando a thread sair (_poll_queues); até lá os perfis/CSV estão em uso
+            self.btn_stop.config(state=tk.DISABLED)
+        else:
+            self._toggle_controls(False)
+
+    @staticmethod
+    def _log_key(e):
+        # Log somente leitura: deixa passar copiar/selecionar tudo e navegação
+        # Control (0x4); no macOS o atalho é Command (Mod1, 0x8)
+        mods = 0x4 | (0x8 if sys.platform == "darwin" else 0)
+        if (e.state & mods) and e.keysym.lower() in ("c", "a"):
+            return None
+        if e.keysym in ("Left", "Right", "Up", "Down", "Prior", "Next", "Home", "End"):
+            return None
+        return "break"
 
     def _log(self, msg: str):
-        self.txt.config(state=tk.NORMAL)
-        self.txt.insert(tk.END, msg + "\n")
-        self.txt.see(tk.END)
-        self.txt.config(state=tk.DISABLED)
+        self.txt.insert("log_end", msg + "\n")
+        self._line_count += msg.count("\n") + 1
+        if self._line_count > LOG_MAX_LINES:
+            # Buffer circular: descarta as linhas mais antigas para o Text não crescer sem limite
+            excesso = self._line_count - LOG_MAX_LINES
+            self.txt.delete("1.0", f"{excesso + 1}.0")
+            self._line_count = LOG_MAX_LINES
+        self.txt.see("log_end")
 
     def _log_clear(self):
-        self.txt.config(state=tk.NORMAL)
         self.txt.delete("1.0", tk.END)
-        self.txt.config(state=tk.DISABLED)
+        self._line_count = 0
 
-    def _poll_queues(self):
+    @staticmethod
+    def _drain(q, limit: Optional[int] = None) -> list:
+        """Esvazia a fila sem bloquear (no máximo `limit` itens)."""
+        itens = []
         try:
-            while True:
-                m = self.log_q.get_nowait()
-                self._log(m)
+            while limit is None or len(itens) < limit:
+                itens.append(q.get_nowait())
         except queue.Empty:
             pass
+        return itens
 
-        try:
-            while True:
-                cur, total = self.progress_q.get_nowait()
-                val = 0 if total == 0 else int((cur / total) * 100)
-                self.prog.config(value=val)
-                if cur >= total and total > 0:
-                    self._toggle_controls(False)
-        except queue.Empty:
-            pass
+    def _poll_queues(self):
+        # Log em lote (limitado por ciclo): um único insert/see no Text
+        records = self._drain(self.log_q, LOG_BATCH_MAX)
+        for record in records:
+            self._log_handler.handle(record)
+        msgs = self._log_handler.pendentes
+        if msgs:
+            self._log("\n".join(msgs))
+            msgs.clear()
+
+        # Progresso: só o último valor importa, um único config na barra
+        progresso = self.progress.take()
+        if progresso is not None:
+            cur, total = progresso
+            if total > 0 and total != self._prog_max:
+                # maximum só muda quando o total muda; depois basta passar `cur`
+                self._prog_max = total
+                self.prog.config(maximum=total, value=cur)
+            else:
+                self.prog.config(value=cur if total > 0 else 0)
+
+        # Controles voltam só quando a thread terminou de fato (fim, parada ou erro fatal)
+        if self._rodando and not (self.worker and self.worker.is_alive()):
+            self._toggle_controls(False)
 
-        self.after(150, self._poll_queues)
+        # Intervalo adaptativo: rápido enquanto há dados, recua até POLL_MAX_MS quando ocioso
+        drained = bool(records) or progresso is not None
+        self._poll_iv = POLL_MIN_MS if drained else min(self._poll_iv * 2, POLL_MAX_MS)
+        self.after(self._poll_iv, self._poll_queues)
 
 
 if __name__ == "__main__":
-    ensure_playwright_browsers_path()
     app = App()
+    # A janela pinta primeiro; a checagem da pasta do Chromium roda em segundo plano
+    # (o ScraperThread chama de novo antes de abrir o navegador)
+    app.after(0, lambda: threading.Thread(target=ensure_playwright_browsers_path, daemon=True).start())
     app.mainloop()